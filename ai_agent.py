@@ -1,14 +1,16 @@
 import os
+import asyncio
 from langchain_groq import ChatGroq
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages.ai import AIMessage
+from rate_limiter import llm_admission, estimate_tokens, PRIORITY_BATCH
 
 # Load API Keys
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
-def get_response_from_ai_agent(llm_id, query, allow_search, system_prompt):
+def _invoke_agent(llm_id, query, allow_search, system_prompt):
     # Ensure it always uses Groq with LLaMA
     llm = ChatGroq(model=llm_id)  # Only using Groq (LLaMA models)
 
@@ -22,9 +24,16 @@ def get_response_from_ai_agent(llm_id, query, allow_search, system_prompt):
     ai_messages = [message.content for message in messages if isinstance(message, AIMessage)]
     return ai_messages[-1] if ai_messages else "No response generated."
 
-# Example Usage
-llm_id = "llama-3.3-70b-versatile"  # Always using LLaMA
-query = "Explain the impact of AI on software development."
-response = get_response_from_ai_agent(llm_id, query, allow_search=False, system_prompt="Provide a detailed answer.")
+async def get_response_from_ai_agent(llm_id, query, allow_search, system_prompt, priority=PRIORITY_BATCH):
+    # Goes through the shared LLM admission controller before calling Groq
+    await llm_admission.acquire(priority, estimate_tokens(str(query), system_prompt))
+    return await asyncio.to_thread(_invoke_agent, llm_id, query, allow_search, system_prompt)
+
+if __name__ == "__main__":
+    # Example Usage
+    llm_id = "llama-3.3-70b-versatile"  # Always using LLaMA
+    query = "Explain the impact of AI on software development."
+    response = asyncio.run(get_response_from_ai_agent(llm_id, query, allow_search=False, system_prompt="Provide a detailed answer."))
+
+    print(response)
 
-print(response)
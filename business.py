@@ -4,6 +4,8 @@ from typing import Optional, Dict, Any
 import httpx
 from fastapi.security import OAuth2PasswordBearer
 from motor.motor_asyncio import AsyncIOMotorClient
+from intent_registry import register_intent, get_intent_spec
+from traffic_recorder import upstream_transport
 
 router = APIRouter(prefix="/business", tags=["Business"])
 NODEJS_API_BASE = "http://localhost:5000/api/v1"  # Update with actual Node.js API URL
@@ -37,31 +39,26 @@ class BusinessUpdate(BaseModel):
     gstNumber: Optional[str] = None
     businessDescription: Optional[str] = None
 
-# Function to detect intent
-def detect_intent(intent: str, data: Dict[str, Any]):
-    if intent == "register_business":
-        return f"{NODEJS_API_BASE}/dealer/business-register", "PUT", data
-    elif intent == "update_business":
-        return f"{NODEJS_API_BASE}/dealer/business-update", "PUT", data
-    else:
-        raise HTTPException(status_code=400, detail=f"Invalid business intent: {intent}")
+class BusinessUpdateIntent(BusinessUpdate):
+    businessId: Optional[str] = None
+
+# Intent registry entries
+register_intent("business", "register_business", "PUT", f"{NODEJS_API_BASE}/dealer/business-register", BusinessCreate)
+register_intent("business", "update_business", "PUT", f"{NODEJS_API_BASE}/dealer/business-update", BusinessUpdateIntent, one_of=("name", "businessId"))
 
 async def handle_intent(intent: str, data: Dict[str, Any], token: str):
-    # Validate required fields for business registration
-    if intent == "register_business" and not all(k in data for k in ["name", "phone", "address", "pincode", "state", "businessCategory", "businessType"]):
-        raise HTTPException(status_code=400, detail="All required fields must be provided for registering a business")
-    
+    # `data` is expected to have been validated against the intent registry
     # For update operations, keep only non-None fields
     if intent == "update_business":
         update_data = {k: v for k, v in data.items() if v is not None}
         data = update_data
     
     # Get API endpoint details
-    url, method, payload = detect_intent(intent, data)
+    url, method, payload = get_intent_spec("business", intent).build_request(data)
     headers = {"Authorization": f"Bearer {token}"}
     
     # Make the API request
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=upstream_transport()) as client:
         try:
             if method == "POST":
                 response = await client.post(url, json=payload, headers=headers)
@@ -6,6 +6,8 @@ from fastapi.security import OAuth2PasswordBearer
 from motor.motor_asyncio import AsyncIOMotorClient
 import json 
 import os
+from intent_registry import register_intent, get_intent_spec
+from traffic_recorder import upstream_transport, recorded
 
 router = APIRouter(prefix="/customers", tags=["Customers"])
 NODEJS_API_BASE = "https://verce-ankurs-projects-b664b274.vercel.app/api/v1"  # Update with actual Node.js API URL
@@ -31,7 +33,23 @@ class CustomerUpdate(BaseModel):
     outstandingBill: Optional[float] = None
     TotalBill: Optional[float] = None
 
+# Intents addressing an existing customer by customerId, name or email
+class CustomerLookup(BaseModel):
+    customerId: Optional[str] = None
+    name: Optional[str] = None
+    email: Optional[EmailStr] = None
+
+class CustomerUpdateIntent(CustomerUpdate):
+    customerId: Optional[str] = None
+
+class CustomerByName(BaseModel):
+    name: str
+
+def customer_not_found():
+    raise HTTPException(status_code=404, detail="Customer not found")
+
 # Fetch customer_id from MongoDB
+@recorded("customer_id_by_email", missing=customer_not_found)
 async def get_customer_id(email: str):
     customer = await db.customers.find_one({"email": email})
     if not customer:
@@ -39,33 +57,27 @@ async def get_customer_id(email: str):
     return str(customer["_id"])
 
 # Fetch customer_id from name
+@recorded("customer_id_by_name", missing=customer_not_found)
 async def get_customer_id_by_name(name: str):
     customer = await db.customers.find_one({"name": name})
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     return str(customer["_id"])
 
-# Function to detect intent
-def detect_intent(intent: str, data: Dict[str, Any]):
-    if intent == "create_customer":
-        print(NODEJS_API_BASE)
-        return f"{NODEJS_API_BASE}/customer/customer-register", "POST", data
-    elif intent == "update_customer":
-        return f"{NODEJS_API_BASE}/customer/customer-register", "PUT", data
-    elif intent == "delete_customer":
-        return f"{NODEJS_API_BASE}/customer/customer-delete", "DELETE", data
-    elif intent == "get_outstanding_bill":
-        return f"{NODEJS_API_BASE}/customer/customer-outstanding", "GET", data
-    elif intent == "get_total_bill":
-        return f"{NODEJS_API_BASE}/customer/customer-totalBill", "GET", data
-    elif intent == "get_customer_by_name" or intent == "get_customer_details":
-        return f"{NODEJS_API_BASE}/dealer/get-by-name", "POST", data
-    else:
-        raise HTTPException(status_code=400, detail=f"Invalid customer intent: {intent}")
+# Intent registry entries
+CUSTOMER_LOOKUP_FIELDS = ("customerId", "name", "email")
+register_intent("customer", "create_customer", "POST", f"{NODEJS_API_BASE}/customer/customer-register", CustomerCreate)
+register_intent("customer", "update_customer", "PUT", f"{NODEJS_API_BASE}/customer/customer-register", CustomerUpdateIntent, one_of=CUSTOMER_LOOKUP_FIELDS)
+register_intent("customer", "delete_customer", "DELETE", f"{NODEJS_API_BASE}/customer/customer-delete", CustomerLookup, one_of=CUSTOMER_LOOKUP_FIELDS)
+register_intent("customer", "get_outstanding_bill", "GET", f"{NODEJS_API_BASE}/customer/customer-outstanding", CustomerLookup, one_of=CUSTOMER_LOOKUP_FIELDS)
+register_intent("customer", "get_total_bill", "GET", f"{NODEJS_API_BASE}/customer/customer-totalBill", CustomerLookup, one_of=CUSTOMER_LOOKUP_FIELDS)
+register_intent("customer", "get_customer_by_name", "POST", f"{NODEJS_API_BASE}/dealer/get-by-name", CustomerByName)
+register_intent("customer", "get_customer_details", "POST", f"{NODEJS_API_BASE}/dealer/get-by-name", CustomerByName)
 
 async def handle_intent(intent: str, data: Dict[str, Any], token: str):
     """
-    Handle customer intents with improved error handling for missing fields
+    Handle customer intents with improved error handling for missing fields.
+    `data` is expected to have been validated against the intent registry.
     """
     # For get_customer_details or get_customer_by_name with name but no customerId
     if (intent == "get_customer_details" or intent == "get_customer_by_name") and "customerId" not in data:
@@ -104,10 +116,10 @@ async def handle_intent(intent: str, data: Dict[str, Any], token: str):
         update_data = {k: v for k, v in data.items() if v is not None}
         data = update_data
     
-    url, method, payload = detect_intent(intent, data)
+    url, method, payload = get_intent_spec("customer", intent).build_request(data)
     headers = {"Authorization": f"Bearer {token}"}
     
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=upstream_transport()) as client:
         try:
             if method == "POST":
                 print(f"Making POST request to: {url}")
@@ -0,0 +1,151 @@
+import re
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+from fastapi import HTTPException
+
+# Placeholder for a value produced by an earlier intent, e.g. "{{t1.customerId}}"
+REFERENCE_PATTERN = re.compile(r"^\{\{\s*([A-Za-z0-9_-]+)\.([A-Za-z0-9_.]+)\s*\}\}$")
+
+def normalize_intents(intent_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Turn the AI response into a list of intent nodes with id, category, intent, data and depends_on.
+    Accepts either a single {category, intent, data} object or {"intents": [...]}.
+    """
+    raw_intents = intent_data.get("intents") if "intents" in intent_data else [intent_data]
+    if not isinstance(raw_intents, list) or not raw_intents:
+        raise HTTPException(status_code=500, detail="Invalid intent format from AI")
+
+    intents = []
+    for index, raw in enumerate(raw_intents):
+        if not isinstance(raw, dict) or not all(k in raw for k in ["category", "intent", "data"]):
+            raise HTTPException(status_code=500, detail="Invalid intent format from AI")
+        intents.append({
+            "id": str(raw.get("id") or f"t{index + 1}"),
+            "category": raw["category"],
+            "intent": raw["intent"],
+            "data": raw["data"] if isinstance(raw["data"], dict) else {},
+            "depends_on": [str(dep) for dep in raw.get("depends_on") or []],
+        })
+
+    ids = {node["id"] for node in intents}
+    if len(ids) != len(intents):
+        raise HTTPException(status_code=500, detail="Duplicate intent ids from AI")
+    for node in intents:
+        # A reference to another intent's result is an implicit dependency
+        for dep in _referenced_ids(node["data"]):
+            if dep not in node["depends_on"]:
+                node["depends_on"].append(dep)
+        unknown = [dep for dep in node["depends_on"] if dep not in ids]
+        if unknown:
+            raise HTTPException(status_code=500, detail=f"Intent {node['id']} depends on unknown intents: {', '.join(unknown)}")
+    _check_acyclic(intents)
+    return intents
+
+def _referenced_ids(value: Any) -> List[str]:
+    if isinstance(value, str):
+        match = REFERENCE_PATTERN.match(value)
+        return [match.group(1)] if match else []
+    if isinstance(value, dict):
+        return [ref for item in value.values() for ref in _referenced_ids(item)]
+    if isinstance(value, list):
+        return [ref for item in value for ref in _referenced_ids(item)]
+    return []
+
+def _check_acyclic(intents: List[Dict[str, Any]]):
+    depends_on = {node["id"]: node["depends_on"] for node in intents}
+    visiting, done = set(), set()
+
+    def visit(node_id: str):
+        if node_id in done:
+            return
+        if node_id in visiting:
+            raise HTTPException(status_code=500, detail=f"Circular intent dependency involving {node_id}")
+        visiting.add(node_id)
+        for dep in depends_on[node_id]:
+            visit(dep)
+        visiting.discard(node_id)
+        done.add(node_id)
+
+    for node_id in depends_on:
+        visit(node_id)
+
+def _lookup(result: Any, path: str):
+    """
+    Resolve a dotted path in a handler result, also looking inside the "data"
+    envelope and falling back from "<name>Id" to MongoDB's "_id"
+    """
+    containers = [result]
+    if isinstance(result, dict) and isinstance(result.get("data"), dict):
+        containers.append(result["data"])
+    for container in containers:
+        value = container
+        keys = path.split(".")
+        for i, key in enumerate(keys):
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+            elif isinstance(value, dict) and i == len(keys) - 1 and key.endswith("Id") and "_id" in value:
+                value = value["_id"]
+            else:
+                break
+        else:
+            return value
+    raise KeyError(path)
+
+def resolve_references(value: Any, results: Dict[str, Any]):
+    """
+    Replace "{{id.path}}" placeholders with values from completed intents
+    """
+    if isinstance(value, str):
+        match = REFERENCE_PATTERN.match(value)
+        if not match:
+            return value
+        node_id, path = match.groups()
+        try:
+            return _lookup(results[node_id], path)
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Could not resolve {value} from the result of intent {node_id}")
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    return value
+
+async def execute_intent_graph(
+    intents: List[Dict[str, Any]],
+    dispatch: Callable[[str, str, Dict[str, Any]], Awaitable[Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Run every intent as soon as its dependencies have succeeded, so independent
+    intents execute concurrently. Intents whose dependencies failed are skipped.
+    """
+    results: Dict[str, Any] = {}
+    outcomes: Dict[str, Dict[str, Any]] = {}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(node: Dict[str, Any]):
+        for dep in node["depends_on"]:
+            await tasks[dep]
+        failed = [dep for dep in node["depends_on"] if outcomes[dep]["status"] != "success"]
+        outcome = {"id": node["id"], "category": node["category"], "intent": node["intent"]}
+        if failed:
+            outcome.update(status="skipped", message=f"Skipped because {', '.join(failed)} did not succeed")
+        else:
+            try:
+                data = resolve_references(node["data"], results)
+                result = await dispatch(node["category"], node["intent"], data)
+                if isinstance(result, dict) and result.get("status") == "error":
+                    outcome.update(status="error", message=result.get("message"), result=result)
+                else:
+                    results[node["id"]] = result
+                    outcome.update(status="success", result=result)
+            except HTTPException as e:
+                outcome.update(status="error", message=e.detail)
+            except Exception as e:
+                outcome.update(status="error", message=str(e))
+        outcomes[node["id"]] = outcome
+
+    # Create all tasks before any of them runs so dependency lookups always succeed
+    for node in intents:
+        tasks[node["id"]] = asyncio.ensure_future(run(node))
+    await asyncio.gather(*tasks.values())
+    return [outcomes[node["id"]] for node in intents]
@@ -0,0 +1,88 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+from urllib.parse import urlencode
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+
+class IntentSpec:
+    """
+    Declarative description of an intent: the Node.js endpoint it maps to and the
+    Pydantic model its data must satisfy. Required fields are worked out once at
+    registration so missing-field checks don't need a validation pass.
+    """
+    def __init__(
+        self,
+        category: str,
+        intent: str,
+        method: str,
+        url: str,
+        model: Type[BaseModel],
+        one_of: Sequence[str] = (),
+        query_fields: Sequence[str] = (),
+        payload_fields: Optional[Sequence[str]] = None,
+        send_payload: bool = True,
+    ):
+        self.category = category
+        self.intent = intent
+        self.method = method
+        self.url = url
+        self.model = model
+        # At least one of these identifies the record; the first is reported when all are missing
+        self.one_of = tuple(one_of)
+        self.query_fields = tuple(query_fields)
+        self.payload_fields = tuple(payload_fields) if payload_fields is not None else None
+        self.send_payload = send_payload
+        self.required_fields = [name for name, field in model.model_fields.items() if field.is_required()]
+
+    def missing_fields(self, data: Dict[str, Any]) -> List[str]:
+        """
+        Required fields absent from `data`, used to ask the user for more information
+        """
+        missing = [field for field in self.required_fields if data.get(field) is None]
+        if self.one_of and all(data.get(field) is None for field in self.one_of):
+            missing.append(self.one_of[0])
+        return missing
+
+    def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate `data` against the intent's model and return the payload to forward.
+        Fields the model doesn't declare are passed through untouched.
+        """
+        missing = self.missing_fields(data)
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Missing required fields for {self.intent}: {', '.join(missing)}")
+        try:
+            validated = self.model.model_validate(data)
+        except ValidationError as e:
+            errors = [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in e.errors()
+            ]
+            raise HTTPException(status_code=400, detail=f"Invalid data for {self.intent}: {'; '.join(errors)}")
+        return {**data, **validated.model_dump(mode="json", exclude_unset=True)}
+
+    def build_request(self, data: Dict[str, Any]) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        """
+        URL, HTTP method and payload for a validated intent
+        """
+        url = self.url
+        if self.query_fields:
+            url = f"{url}?{urlencode({field: data[field] for field in self.query_fields})}"
+        if not self.send_payload:
+            return url, self.method, None
+        if self.payload_fields is not None:
+            return url, self.method, {field: data[field] for field in self.payload_fields}
+        return url, self.method, data
+
+# (category, intent) -> IntentSpec
+INTENT_REGISTRY: Dict[Tuple[str, str], IntentSpec] = {}
+
+def register_intent(category: str, intent: str, method: str, url: str, model: Type[BaseModel], **options) -> IntentSpec:
+    spec = IntentSpec(category, intent, method, url, model, **options)
+    INTENT_REGISTRY[(category, intent)] = spec
+    return spec
+
+def get_intent_spec(category: str, intent: str) -> IntentSpec:
+    spec = INTENT_REGISTRY.get((category, intent))
+    if spec is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {category} intent: {intent}")
+    return spec
@@ -0,0 +1,184 @@
+import json
+import uuid
+import asyncio
+import contextvars
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import httpx
+from fastapi import HTTPException
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# Failures where the request never reached the server
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+def is_retryable(exc: Exception) -> bool:
+    """
+    Jobs may not be idempotent (an invoice is emailed when generated), so only retry
+    when the upstream never received the request or explicitly rate limited it.
+    Read timeouts and 5xx are not retried: the upstream may have done the work.
+    """
+    if isinstance(exc, NOT_SENT_ERRORS) or isinstance(exc.__cause__, NOT_SENT_ERRORS):
+        return True
+    return isinstance(exc, HTTPException) and exc.status_code == 429
+
+class JobQueue:
+    """
+    In-process background job queue with bounded worker concurrency and retry.
+    Jobs are submitted in batches; each job runs `handler(payload)` and its
+    status can be polled or streamed as it progresses.
+    """
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+        concurrency: int = 8,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        max_finished_jobs: int = 10000,
+    ):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.batches: Dict[str, List[str]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._changed: Optional[asyncio.Condition] = None
+
+    def _ensure_workers(self):
+        # Workers are started lazily so the queue binds to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._changed = asyncio.Condition()
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.concurrency:
+            # Fresh context so workers don't inherit per-request state from whoever started them
+            worker = asyncio.get_running_loop().create_task(self._worker(), context=contextvars.Context())
+            self._workers.append(worker)
+
+    async def submit(self, payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Queue one job per payload and return the batch and job IDs immediately
+        """
+        self._ensure_workers()
+        batch_id = uuid.uuid4().hex
+        job_ids = []
+        for payload in payloads:
+            job_id = uuid.uuid4().hex
+            now = datetime.utcnow().isoformat()
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "batch_id": batch_id,
+                "status": JOB_QUEUED,
+                "attempts": 0,
+                "payload": payload,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            job_ids.append(job_id)
+            self._queue.put_nowait(job_id)
+        self.batches[batch_id] = job_ids
+        self._prune()
+        return {"batch_id": batch_id, "job_ids": job_ids}
+
+    def _prune(self):
+        """
+        Drop the oldest fully finished batches once too many finished jobs are kept.
+        Whole batches are removed so a batch's progress never loses jobs.
+        """
+        finished = sum(1 for job in self.jobs.values() if job["status"] in FINISHED_STATES)
+        for batch_id, job_ids in list(self.batches.items()):
+            if finished <= self.max_finished_jobs:
+                break
+            if all(self.jobs[job_id]["status"] in FINISHED_STATES for job_id in job_ids):
+                for job_id in job_ids:
+                    del self.jobs[job_id]
+                del self.batches[batch_id]
+                finished -= len(job_ids)
+
+    async def _set_status(self, job: Dict[str, Any], status: str, **fields):
+        job.update(fields, status=status, updated_at=datetime.utcnow().isoformat())
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self.jobs.get(job_id)
+                if job is not None:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Dict[str, Any]):
+        await self._set_status(job, JOB_RUNNING, attempts=job["attempts"] + 1)
+        try:
+            result = await self.handler(job["payload"])
+        except Exception as exc:
+            error = exc.detail if isinstance(exc, HTTPException) else str(exc)
+            if is_retryable(exc) and job["attempts"] <= self.max_retries:
+                await self._set_status(job, JOB_QUEUED, error=error)
+                # Re-queue after the backoff instead of holding this worker slot while waiting
+                delay = self.retry_backoff * 2 ** (job["attempts"] - 1)
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job["job_id"])
+                return
+            await self._set_status(job, JOB_FAILED, error=error)
+            return
+        await self._set_status(job, JOB_SUCCEEDED, result=result, error=None)
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        # Payloads can hold personal data (e.g. invoice recipient emails), so status views leave them out
+        return {key: value for key, value in job.items() if key != "payload"}
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return self._public(job)
+
+    def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        """
+        Aggregate status of every job in a batch
+        """
+        job_ids = self.batches.get(batch_id)
+        if job_ids is None:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        jobs = [self._public(self.jobs[job_id]) for job_id in job_ids if job_id in self.jobs]
+        counts = {state: 0 for state in (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED)}
+        for job in jobs:
+            counts[job["status"]] += 1
+        return {
+            "batch_id": batch_id,
+            "total": len(job_ids),
+            "completed": counts[JOB_SUCCEEDED] + counts[JOB_FAILED],
+            "counts": counts,
+            "jobs": jobs,
+        }
+
+    async def stream_batch(self, batch_id: str, heartbeat: float = 15.0):
+        """
+        Yield server-sent events with the batch progress whenever a job changes state
+        """
+        batch = self.get_batch(batch_id)
+        self._ensure_workers()
+        while True:
+            yield f"data: {json.dumps(batch)}\n\n"
+            if batch["completed"] >= batch["total"]:
+                return
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self.get_batch(batch_id)
@@ -1,10 +1,11 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, Request, Header
 from typing import Dict, Any, List, Optional
-from customer import router as customer_router, detect_intent as customer_detect_intent, handle_intent as customer_handle_intent
-from business import router as business_router, detect_intent as business_detect_intent, handle_intent as business_handle_intent
-from product import router as product_router
-from sales import router as sales_router
+from customer import router as customer_router, handle_intent as customer_handle_intent
+from business import router as business_router, handle_intent as business_handle_intent
+from product import router as product_router, handle_intent as product_handle_intent
+from sales import router as sales_router, handle_intent as sales_handle_intent
 from langchain_groq import ChatGroq
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langgraph.prebuilt import create_react_agent
@@ -18,8 +19,21 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime
 from bson import ObjectId
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from rate_limiter import llm_admission, estimate_tokens, PRIORITY_INTERACTIVE
+from intent_dag import normalize_intents, execute_intent_graph
+from intent_registry import INTENT_REGISTRY, get_intent_spec
+import traffic_recorder
+from profiling import router as admin_router, request_profiler, loop_lag_monitor, LOOP_LAG_THRESHOLD_MS
 
-app = FastAPI(title="Vypar app")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LOOP_LAG_THRESHOLD_MS:
+        loop_lag_monitor.start(float(LOOP_LAG_THRESHOLD_MS))
+    yield
+    loop_lag_monitor.stop()
+
+app = FastAPI(title="Vypar app", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins, you can restrict this to specific domains
@@ -46,6 +60,7 @@ app.include_router(customer_router)
 app.include_router(business_router)
 app.include_router(product_router)
 app.include_router(sales_router)
+app.include_router(admin_router)
 
 class IntentRequest(BaseModel):
     user_query: str
@@ -59,6 +74,7 @@ class DetectedIntent(BaseModel):
     data: Dict[str, Any]
 
 # Get user's conversation history to maintain context
+@traffic_recorder.recorded("conversation_history", missing=list)
 async def get_conversation_history(conversation_id: str, max_messages: int = 5):
     """
     Retrieve the recent conversation history for context
@@ -80,6 +96,9 @@ async def save_conversation_message(conversation_id: str, role: str, content: st
     """
     Save a conversation message to MongoDB
     """
+    # Replays are load tests; keep them out of the real conversation store
+    if traffic_recorder.is_replaying():
+        return
     await db.conversations.insert_one({
         "conversation_id": conversation_id,
         "user_id": user_id,
@@ -88,14 +107,8 @@ async def save_conversation_message(conversation_id: str, role: str, content: st
         "timestamp": datetime.utcnow()
     })
 
-def get_intent_from_ai_agent(query: str, conversation_history: List[Dict[str, Any]] = None):
-    """
-    Use the LLM to determine the category, intent, and extract relevant data from user query
-    with conversation history for context
-    """
-    llm = ChatGroq(model="llama-3.3-70b-versatile")
-    
-    system_prompt = """
+# System prompt sent with every intent detection call
+INTENT_SYSTEM_PROMPT = """
     You are an AI assistant that detects intents from user queries and extracts relevant data.
     Your task is to categorize the user's request into one of four categories: 'customer', 'business', 'product', or 'sales'.
     
@@ -111,8 +124,6 @@ def get_intent_from_ai_agent(query: str, conversation_history: List[Dict[str, An
     For 'business' category:
     - register_business: Register a new business (requires name, phone, address, pincode, state, businessCategory, businessType)
     - update_business: Update business details (requires businessId or name and at least one field to update)
-    - delete_business: Delete a business (requires businessId or name)
-    - get_business_details: Get business details (requires businessId or name)
     
     For 'product' category:
     - create_product: Create a new product (requires name, gstRate, rate)
@@ -126,9 +137,22 @@ def get_intent_from_ai_agent(query: str, conversation_history: List[Dict[str, An
     
     Extract all relevant data for the detected intent.
     Respond with a JSON object containing 'category', 'intent', and 'data' fields.
+    
+    If the query asks for several actions, respond instead with a JSON object of the form
+    {"intents": [{"id": "t1", "category": ..., "intent": ..., "data": {...}, "depends_on": []}, ...]}
+    with one entry per action. When an action needs a value produced by an earlier action
+    (for example a sale for a customer created in the same query), list that action's id in
+    'depends_on' and use the placeholder "{{<id>.<field>}}" as the value, e.g. "customerId": "{{t1.customerId}}".
+    """
+
+def get_intent_from_ai_agent(query: str, conversation_history: List[Dict[str, Any]] = None):
     """
+    Use the LLM to determine the category, intent, and extract relevant data from user query
+    with conversation history for context
+    """
+    llm = ChatGroq(model="llama-3.3-70b-versatile")
     
-    agent = create_react_agent(model=llm, tools=[], state_modifier=system_prompt)
+    agent = create_react_agent(model=llm, tools=[], state_modifier=INTENT_SYSTEM_PROMPT)
     
     messages = []
     
@@ -162,38 +186,9 @@ def get_intent_from_ai_agent(query: str, conversation_history: List[Dict[str, An
 
 # Check if all required fields are present for an intent
 def check_required_fields(category: str, intent: str, data: Dict[str, Any]):
-    required_fields = []
-    
-    if category == "customer":
-        if intent == "create_customer":
-            required_fields = ["name", "email", "phone"]
-        elif intent in ["update_customer", "delete_customer", "get_outstanding_bill", "get_total_bill"]:
-            if "customerId" not in data and "name" not in data and "email" not in data:
-                required_fields = ["customerId"] 
-
-        elif intent in ["get_customer_by_name", "get_customer_details"]:
-               required_fields = ["name"]
-                
-    elif category == "business":
-        if intent == "register_business":
-            required_fields = ["name", "phone", "address", "pincode", "state", "businessCategory", "businessType"]
-        elif intent in ["update_business", "delete_business", "get_business_details"]:
-            required_fields = ["businessId"] if "businessId" in data else ["name"]
-    elif category == "product":
-        if intent == "create_product":
-            required_fields = ["name", "gstRate", "rate"]
-        elif intent in ["update_product", "delete_product"]:
-            required_fields = ["productId"]
-        elif intent == "get_product_by_name":
-            required_fields = ["name"]
-    elif category == "sales":
-        if intent == "create_sale":
-            required_fields = ["customerId", "products", "paymentMethod"]
-        elif intent == "generate_invoice":
-            required_fields = ["saleId", "recipientEmail"]
-    
-    missing_fields = [field for field in required_fields if field not in data or data[field] is None]
-    return missing_fields
+    spec = INTENT_REGISTRY.get((category, intent))
+    # Unknown intents are rejected when dispatched, so one bad node doesn't fail a whole graph
+    return spec.missing_fields(data) if spec is not None else []
 
 # Helper function to extract token from Authorization header
 async def get_token_from_authorization(authorization: Optional[str] = Header(None)):
@@ -210,15 +205,43 @@ async def get_token_from_authorization(authorization: Optional[str] = Header(Non
 def generate_conversation_id():
     return str(ObjectId())
 
+# Handler for each intent category, called with already validated data
+INTENT_HANDLERS = {
+    "customer": customer_handle_intent,
+    "business": business_handle_intent,
+    "product": lambda intent, data, token: product_handle_intent(intent, data),
+    "sales": lambda intent, data, token: sales_handle_intent(intent, data),
+}
+
+# Validate an intent against the registry and route it to its category handler
+async def dispatch_intent(category: str, intent: str, data: Dict[str, Any], token: str):
+    payload = get_intent_spec(category, intent).validate(data)
+    return await INTENT_HANDLERS[category](intent, payload, token)
+
 @app.post("/process-query")
 async def process_natural_language_query(
     request: IntentRequest,
-    token: str = Depends(get_token_from_authorization)
+    token: str = Depends(get_token_from_authorization),
+    x_replay_id: Optional[str] = Header(None)
 ):
     """
     Process a natural language query to determine intent and action
     Also handles completing intents with missing fields via additional_data
     """
+    # Profile this request if an admin has turned on sampling
+    with request_profiler.profile_request("/process-query"):
+        # Record (or replay) the exchange when traffic capture is enabled
+        if traffic_recorder.begin(request.dict(), x_replay_id) is None:
+            return await handle_natural_language_query(request, token)
+        try:
+            result = await handle_natural_language_query(request, token)
+        except HTTPException as e:
+            traffic_recorder.finish(e.status_code, {"detail": e.detail})
+            raise
+        traffic_recorder.finish(200, result)
+        return result
+
+async def handle_natural_language_query(request: IntentRequest, token: str):
     # Get conversation ID or create a new one
     conversation_id = request.conversation_id
     if not conversation_id:
@@ -230,45 +253,73 @@ async def process_natural_language_query(
     # Check if this is a follow-up with additional data for missing fields
     previous_intent = None
     if request.additional_data and len(conversation_history) > 0:
-        # Try to find the last saved intent in the conversation history
+        # Only the latest assistant reply can be an open request for missing fields
         for message in reversed(conversation_history):
-            if message["role"] == "assistant" and "missing_fields" in message["content"]:
+            if message["role"] != "assistant":
+                continue
+            if '"stored_intent"' in message["content"]:
                 try:
-                    # Look for stored intent in the last missing_fields response
-                    stored_intent_match = re.search(r'"stored_intent":\s*({.*?})', message["content"])
+                    # Look for stored intent in the missing fields response
+                    stored_intent_match = re.search(r'"stored_intent":\s*({.*})', message["content"], re.DOTALL)
                     if stored_intent_match:
                         previous_intent = json.loads(stored_intent_match.group(1))
-                        break
                 except:
                     pass
+            break
+    
+    # If we have a previous intent with missing fields and additional data, use that
+    use_previous_intent = bool(previous_intent and request.additional_data)
+    replayed_intent = None if use_previous_intent else traffic_recorder.replayed_llm_result()
+    if not use_previous_intent and replayed_intent is None:
+        # Wait for the LLM admission controller before storing the query, so a request
+        # shed with a 429 is not saved twice when the client retries
+        history_text = " ".join(msg["content"] for msg in conversation_history)
+        await llm_admission.acquire(PRIORITY_INTERACTIVE, estimate_tokens(INTENT_SYSTEM_PROMPT, request.user_query, history_text))
     
     # Save user query to conversation history
     await save_conversation_message(conversation_id, "user", request.user_query, user_id=None)
     
-    # If we have a previous intent with missing fields and additional data, use that
-    if previous_intent and request.additional_data:
+    if use_previous_intent:
         intent_data = previous_intent
-        # Update the data with the additional fields provided
-        for field, value in request.additional_data.items():
-            if value is not None:
-                intent_data["data"][field] = value
+        if "intents" in intent_data:
+            # Multi-intent follow-up: a dict keyed by intent id goes to that intent,
+            # plain fields fill every intent that reported them missing
+            for node in intent_data["intents"]:
+                node_missing = check_required_fields(node["category"], node["intent"], node["data"])
+                for field, value in request.additional_data.items():
+                    if field == node.get("id") and isinstance(value, dict):
+                        node["data"].update({k: v for k, v in value.items() if v is not None})
+                    elif field in node_missing and value is not None:
+                        node["data"][field] = value
+        else:
+            # Update the data with the additional fields provided
+            for field, value in request.additional_data.items():
+                if value is not None:
+                    intent_data["data"][field] = value
     else:
-        # Get intent from AI agent
-        intent_data = get_intent_from_ai_agent(request.user_query, conversation_history)
-    
-    if not all(k in intent_data for k in ["category", "intent", "data"]):
-        raise HTTPException(status_code=500, detail="Invalid intent format from AI")
+        intent_data = replayed_intent
+        if intent_data is None:
+            # Get intent from AI agent
+            intent_data = await run_in_threadpool(request_profiler.wrap(get_intent_from_ai_agent), request.user_query, conversation_history)
+        traffic_recorder.record_llm_result(intent_data)
     
-    category = intent_data["category"]
-    intent = intent_data["intent"]
-    data = intent_data["data"]
+    intents = normalize_intents(intent_data)
+    is_multi_intent = "intents" in intent_data
     
     # Check for missing required fields
-    missing_fields = check_required_fields(category, intent, data)
+    missing_by_intent = {
+        node["id"]: check_required_fields(node["category"], node["intent"], node["data"])
+        for node in intents
+    }
+    missing_fields = []
+    for fields in missing_by_intent.values():
+        missing_fields.extend(field for field in fields if field not in missing_fields)
     
     # If fields are missing, ask the user to provide them
     if missing_fields:
         # Store the current intent in the response for later continuation
+        if is_multi_intent:
+            intent_data = {"intents": intents}
         stored_intent_json = json.dumps(intent_data)
         
         response = {
@@ -279,6 +330,8 @@ async def process_natural_language_query(
             "stored_intent": intent_data,
             "how_to_proceed": "Please send another request to /process-query with the same conversation_id and the missing fields in the additional_data field."
         }
+        if is_multi_intent:
+            response["required_fields_by_intent"] = {node_id: fields for node_id, fields in missing_by_intent.items() if fields}
         
         # Save assistant response to conversation history including the stored intent
         response_content = f"Please provide the following information: {', '.join(missing_fields)}. \"stored_intent\": {stored_intent_json}"
@@ -286,18 +339,33 @@ async def process_natural_language_query(
         
         return response
     
+    # Reject a bad single-intent payload before any upstream request
+    if not is_multi_intent:
+        node = intents[0]
+        try:
+            payload = get_intent_spec(node["category"], node["intent"]).validate(node["data"])
+        except HTTPException as e:
+            await save_conversation_message(conversation_id, "assistant", f"Error: {e.detail}")
+            raise
+    
     # Process the intent with the appropriate handler
     try:
-        if category == "customer":
-            result = await customer_handle_intent(intent, data, token)
-        elif category == "business":
-            result = await business_handle_intent(intent, data, token)
-        elif category == "product":
-            result = await product_router.handle_intent(intent, data, token)
-        elif category == "sales":
-            result = await sales_router.handle_intent(intent, data, token)
+        if is_multi_intent:
+            # Independent intents run concurrently, dependent ones wait for the results they reference
+            outcomes = await execute_intent_graph(
+                intents,
+                lambda category, intent, data: dispatch_intent(category, intent, data, token),
+            )
+            succeeded = sum(1 for outcome in outcomes if outcome["status"] == "success")
+            if succeeded == len(outcomes):
+                status = "success"
+            elif succeeded:
+                status = "partial"
+            else:
+                status = "error"
+            result = {"status": status, "results": outcomes}
         else:
-            raise HTTPException(status_code=400, detail=f"Invalid category: {category}")
+            result = await INTENT_HANDLERS[node["category"]](node["intent"], payload, token)
         
         # Save the successful response to conversation history
         response_content = json.dumps(result) if isinstance(result, dict) else str(result)
@@ -317,6 +385,13 @@ async def process_natural_language_query(
         await save_conversation_message(conversation_id, "assistant", f"Error: {error_message}")
         raise HTTPException(status_code=500, detail=error_message)
 
+@app.get("/llm-admission/stats")
+async def get_llm_admission_stats(token: str = Depends(get_token_from_authorization)):
+    """
+    Current LLM rate-limit budgets, queue depth and queue wait times
+    """
+    return llm_admission.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import httpx
+from intent_registry import register_intent, get_intent_spec
+from traffic_recorder import upstream_transport
 
 router = APIRouter(prefix="/products", tags=["Products"])
 NODEJS_API_BASE = "http://localhost:5000/api/v1"  # Updated Node.js API URL
@@ -18,53 +20,33 @@ class ProductUpdate(BaseModel):
     gstRate: Optional[float] = None
     rate: Optional[float] = None
 
-# Function to detect intent
-def detect_intent(intent: str, data: Dict[str, Any]):
-    """
-    Map product-related intents to appropriate API endpoints and HTTP methods
-    """
-    if intent == "create_product":
-        return f"{NODEJS_API_BASE}/product/create-product", "POST", data
-    
-    elif intent == "update_product":
-        return f"{NODEJS_API_BASE}/product/update-product", "PUT", data
-    
-    elif intent == "delete_product":
-        product_id = data.get("productId")
-        if not product_id:
-            raise HTTPException(status_code=400, detail="productId is required for delete operation")
-        return f"{NODEJS_API_BASE}/product/delete-product", "DELETE", {"productId": product_id}
-    
-    elif intent == "get_product_by_name":
-        name = data.get("name")
-        if not name:
-            raise HTTPException(status_code=400, detail="name is required to find a product")
-        return f"{NODEJS_API_BASE}/product/get-by-name/find?name={name}", "GET", None
-    
-    elif intent == "get_all_products":
-        return f"{NODEJS_API_BASE}/product/all", "GET", None
-    
-    else:
-        raise HTTPException(status_code=400, detail=f"Invalid product intent: {intent}")
+class ProductDelete(BaseModel):
+    productId: str
+
+class ProductByName(BaseModel):
+    name: str
+
+class ProductListAll(BaseModel):
+    pass
+
+# Intent registry entries
+register_intent("product", "create_product", "POST", f"{NODEJS_API_BASE}/product/create-product", ProductCreate)
+register_intent("product", "update_product", "PUT", f"{NODEJS_API_BASE}/product/update-product", ProductUpdate)
+register_intent("product", "delete_product", "DELETE", f"{NODEJS_API_BASE}/product/delete-product", ProductDelete, payload_fields=["productId"])
+register_intent("product", "get_product_by_name", "GET", f"{NODEJS_API_BASE}/product/get-by-name/find", ProductByName, query_fields=["name"], send_payload=False)
+register_intent("product", "get_all_products", "GET", f"{NODEJS_API_BASE}/product/all", ProductListAll, send_payload=False)
 
 
 async def handle_intent(intent: str, data: Dict[str, Any]):
     """
-    Process product-related intents with provided data and forward to Node.js API
+    Process product-related intents with provided data and forward to Node.js API.
+    `data` is expected to have been validated against the intent registry.
     """
-    # Validate data based on intent
-    if intent == "create_product" and not all(k in data for k in ["name", "gstRate", "rate"]):
-        raise HTTPException(status_code=400, detail="Name, gstRate, and rate are required for creating a product")
-    
-    elif intent == "update_product" and "productId" not in data:
-        raise HTTPException(status_code=400, detail="productId is required for updating a product")
-    
     # Get URL, method, and payload for the intent
-    url, method, payload = detect_intent(intent, data)
-    url = "http://localhost:5000/api/v1"
+    url, method, payload = get_intent_spec("product", intent).build_request(data)
     
     # Make the API request
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=upstream_transport()) as client:
         try:
             if method == "POST":
                 response = await client.post(url, json=payload)
@@ -0,0 +1,309 @@
+import io
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import cProfile
+import logging
+import marshal
+import pstats
+import secrets
+import threading
+import traceback
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger("vypar.profiling")
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Start the event-loop lag monitor at startup when set (milliseconds)
+LOOP_LAG_THRESHOLD_MS = os.getenv("LOOP_LAG_THRESHOLD_MS")
+
+async def require_admin(authorization: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    parts = (authorization or "").split()
+    if len(parts) != 2 or parts[0].lower() != "bearer" or not secrets.compare_digest(parts[1], ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+class _ProfileSession:
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.started_at = datetime.utcnow().isoformat()
+        self.started = time.perf_counter()
+        self.profiles: List[cProfile.Profile] = []
+        self.lock = threading.Lock()
+
+    def add(self, profile: cProfile.Profile):
+        with self.lock:
+            self.profiles.append(profile)
+
+_current_session: ContextVar[Optional[_ProfileSession]] = ContextVar("current_profile_session", default=None)
+
+class RequestProfiler:
+    """
+    Samples live requests with cProfile. Only one request is profiled at a time
+    because cProfile hooks the whole event loop thread, so work from other requests
+    running concurrently on the loop shows up in the same profile. When no sampling
+    is active the per-request cost is a single attribute check.
+    """
+    def __init__(self, max_stored: int = 20):
+        self.active = False
+        self.sample_rate = 0.0
+        self.remaining = 0
+        self.profiles: "deque[Dict[str, Any]]" = deque(maxlen=max_stored)
+        self._busy = False
+
+    def start(self, sample_rate: float, max_profiles: int):
+        self.sample_rate = sample_rate
+        self.remaining = max_profiles
+        self.active = max_profiles > 0
+
+    def stop(self):
+        self.active = False
+
+    def profile_request(self, name: str):
+        """
+        Context manager that profiles the enclosed request if it is sampled
+        """
+        if not self.active or self._busy or random.random() >= self.sample_rate:
+            return nullcontext()
+        return _ProfiledRequest(self, name)
+
+    def wrap(self, func: Callable) -> Callable:
+        """
+        Profile `func` in whichever thread runs it when the current request is sampled,
+        e.g. work handed to run_in_threadpool
+        """
+        session = _current_session.get()
+        if session is None:
+            return func
+
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler already owns this interpreter (Python 3.12+)
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                session.add(profile)
+        return profiled
+
+    def _finish(self, session: _ProfileSession):
+        stats = None
+        for profile in session.profiles:
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        if stats is None:
+            return
+        self.profiles.append({
+            "id": session.id,
+            "name": session.name,
+            "started_at": session.started_at,
+            "duration_ms": round((time.perf_counter() - session.started) * 1000, 2),
+            "total_calls": stats.total_calls,
+            "stats": stats,
+        })
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.active = False
+
+    def get(self, profile_id: str) -> Dict[str, Any]:
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "sample_rate": self.sample_rate,
+            "remaining": self.remaining if self.active else 0,
+            "profiles": [{k: v for k, v in profile.items() if k != "stats"} for profile in self.profiles],
+        }
+
+class _ProfiledRequest:
+    def __init__(self, profiler: RequestProfiler, name: str):
+        self.profiler = profiler
+        self.session = _ProfileSession(name)
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profiler._busy = True
+        self._token = _current_session.set(self.session)
+        self.profile.enable()
+        return self.session
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        _current_session.reset(self._token)
+        self.session.add(self.profile)
+        self.profiler._busy = False
+        self.profiler._finish(self.session)
+        return False
+
+class LoopLagMonitor:
+    """
+    Detects tasks blocking the event loop. A coroutine on the loop updates a
+    heartbeat; a watchdog thread notices when the heartbeat goes stale and logs
+    the loop thread's stack while it is still blocked.
+    """
+    def __init__(self, max_stalls: int = 50):
+        self.threshold = 0.0
+        self.interval = 0.0
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.stalls: "deque[Dict[str, Any]]" = deque(maxlen=max_stalls)
+        self._heartbeat = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, threshold_ms: float):
+        self.stop()
+        self.threshold = threshold_ms / 1000
+        self.interval = min(self.threshold / 2, 0.1)
+        loop = asyncio.get_running_loop()
+        self._heartbeat = time.monotonic()
+        self._stop = threading.Event()
+        self._task = loop.create_task(self._beat())
+        self._thread = threading.Thread(
+            target=self._watch, args=(loop, threading.get_ident(), self._stop), name="loop-lag-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.max_lag = max(self.max_lag, now - expected)
+            self._heartbeat = now
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int, stop: threading.Event):
+        reported = False
+        while not stop.wait(self.interval / 2):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for <= self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            # Capture the stack while the loop is still stuck
+            reported = True
+            frame = sys._current_frames().get(loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            task = asyncio.current_task(loop)
+            self.stall_count += 1
+            self.stalls.append({
+                "detected_at": datetime.utcnow().isoformat(),
+                "blocked_ms": round(blocked_for * 1000, 1),
+                "task": task.get_name() if task is not None else None,
+                "coroutine": repr(task.get_coro()) if task is not None else None,
+                "stack": stack,
+            })
+            logger.warning(
+                "Event loop blocked for over %.0f ms by task %s:\n%s",
+                blocked_for * 1000, task.get_name() if task is not None else "<none>", stack,
+            )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stall_count": self.stall_count,
+            "stalls": list(self.stalls),
+        }
+
+request_profiler = RequestProfiler()
+loop_lag_monitor = LoopLagMonitor()
+
+class ProfilingStart(BaseModel):
+    sample_rate: float = Field(1.0, gt=0, le=1)
+    max_profiles: int = Field(5, gt=0, le=100)
+
+class LoopMonitorStart(BaseModel):
+    threshold_ms: float = Field(100, gt=0)
+
+@router.post("/profiling/start", dependencies=[Depends(require_admin)])
+async def start_profiling(request: ProfilingStart):
+    """
+    Profile a sample of upcoming /process-query requests
+    """
+    request_profiler.start(request.sample_rate, request.max_profiles)
+    return request_profiler.status()
+
+@router.post("/profiling/stop", dependencies=[Depends(require_admin)])
+async def stop_profiling():
+    request_profiler.stop()
+    return request_profiler.status()
+
+@router.get("/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling_status():
+    return request_profiler.status()
+
+PROFILE_SORT_KEYS = sorted(key.value for key in pstats.SortKey)
+
+@router.get("/profiling/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str, format: str = "prof", sort: str = "cumulative", limit: int = 50):
+    """
+    Download a captured profile as a .prof file (for snakeviz, pstats, ...) or as text
+    """
+    stats = request_profiler.get(profile_id)["stats"]
+    if format == "text":
+        if sort not in PROFILE_SORT_KEYS:
+            raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(PROFILE_SORT_KEYS)}")
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats(sort).print_stats(limit)
+        return PlainTextResponse(output.getvalue())
+    if format != "prof":
+        raise HTTPException(status_code=400, detail="format must be 'prof' or 'text'")
+    return Response(
+        content=marshal.dumps(stats.stats),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'},
+    )
+
+@router.post("/loop-monitor/start", dependencies=[Depends(require_admin)])
+async def start_loop_monitor(request: LoopMonitorStart):
+    loop_lag_monitor.start(request.threshold_ms)
+    return loop_lag_monitor.status()
+
+@router.post("/loop-monitor/stop", dependencies=[Depends(require_admin)])
+async def stop_loop_monitor():
+    loop_lag_monitor.stop()
+    return loop_lag_monitor.status()
+
+@router.get("/loop-monitor", dependencies=[Depends(require_admin)])
+async def get_loop_monitor_status():
+    return loop_lag_monitor.status()
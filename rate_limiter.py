@@ -0,0 +1,217 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Optional, Dict, Any, List
+from fastapi import HTTPException
+
+# Groq limits for llama-3.3-70b-versatile (override per deployment)
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "6000"))
+# Longest a caller may wait in the admission queue before being shed with a 429
+LLM_MAX_QUEUE_WAIT = float(os.getenv("LLM_MAX_QUEUE_WAIT", "10"))
+LLM_MAX_QUEUE_SIZE = int(os.getenv("LLM_MAX_QUEUE_SIZE", "100"))
+# Completion tokens reserved per call on top of the prompt estimate
+LLM_COMPLETION_TOKEN_RESERVE = int(os.getenv("LLM_COMPLETION_TOKEN_RESERVE", "300"))
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """
+    Rough token estimate (~4 characters per token) plus the completion reserve
+    """
+    chars = sum(len(text) for text in texts if text)
+    return chars // 4 + LLM_COMPLETION_TOKEN_RESERVE
+
+class TokenBucket:
+    """
+    Continuously refilling token bucket
+    """
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """
+        Seconds until `amount` tokens are available (0 if available now)
+        """
+        self._refill()
+        # A single request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+class _Waiter:
+    def __init__(self, priority: int, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+
+class AdmissionController:
+    """
+    Admission control for LLM calls: request and token budgets are tracked with
+    token buckets, excess work queues by priority, and callers that would wait
+    longer than `max_queue_wait` are rejected with a 429 and Retry-After.
+    """
+    def __init__(
+        self,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        max_queue_wait: float = LLM_MAX_QUEUE_WAIT,
+        max_queue_size: int = LLM_MAX_QUEUE_SIZE,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.max_queue_wait = max_queue_wait
+        self.max_queue_size = max_queue_size
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._stats: Dict[int, Dict[str, float]] = {}
+
+    def _time_until_ready(self, requests: int, tokens: int) -> float:
+        return max(
+            self.request_bucket.time_until(requests),
+            self.token_bucket.time_until(tokens),
+        )
+
+    def _estimated_wait(self, priority: int, tokens: int) -> float:
+        """
+        Time until the buckets can serve everything queued at or ahead of `priority`
+        plus this request
+        """
+        ahead = [waiter for _, _, waiter in self._waiters if waiter.priority <= priority and not waiter.future.done()]
+        requests_needed = len(ahead) + 1
+        # Like TokenBucket.time_until, a request larger than the bucket only waits for a full bucket
+        capacity = self.token_bucket.capacity
+        tokens_needed = min(tokens, capacity) + sum(min(waiter.tokens, capacity) for waiter in ahead)
+        request_wait = max(0.0, requests_needed - self.request_bucket.tokens) / self.request_bucket.refill_per_second
+        token_wait = max(0.0, tokens_needed - self.token_bucket.tokens) / self.token_bucket.refill_per_second
+        return max(request_wait, token_wait)
+
+    def _stats_for(self, priority: int) -> Dict[str, float]:
+        if priority not in self._stats:
+            self._stats[priority] = {"admitted": 0, "shed": 0, "total_wait": 0.0, "max_wait": 0.0}
+        return self._stats[priority]
+
+    def _record_admitted(self, priority: int, waited: float):
+        stats = self._stats_for(priority)
+        stats["admitted"] += 1
+        stats["total_wait"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+
+    def _shed(self, priority: int, retry_after: float):
+        self._stats_for(priority)["shed"] += 1
+        raise HTTPException(
+            status_code=429,
+            detail="LLM capacity exceeded, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = LLM_COMPLETION_TOKEN_RESERVE) -> float:
+        """
+        Wait for request and token budget; returns the time spent queued in seconds
+        """
+        enqueued_at = time.monotonic()
+
+        # Fast path: nothing queued and budget is available right now
+        if not self._waiters and self._time_until_ready(1, tokens) == 0:
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(tokens)
+            self._record_admitted(priority, 0.0)
+            return 0.0
+
+        self.request_bucket._refill()
+        self.token_bucket._refill()
+        estimated_wait = self._estimated_wait(priority, tokens)
+        if len(self._waiters) >= self.max_queue_size or estimated_wait > self.max_queue_wait:
+            self._shed(priority, estimated_wait)
+
+        waiter = _Waiter(priority, tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self._notify()
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.max_queue_wait)
+        except asyncio.TimeoutError:
+            # Outranked by higher-priority work while queued
+            self._shed(priority, self._estimated_wait(priority, tokens))
+
+        waited = time.monotonic() - enqueued_at
+        self._record_admitted(priority, waited)
+        return waited
+
+    def _notify(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """
+        Release queued waiters in priority order as the buckets refill
+        """
+        while self._waiters:
+            _, _, waiter = self._waiters[0]
+            if waiter.future.done():
+                # Timed out or cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+
+            delay = self._time_until_ready(1, waiter.tokens)
+            if delay == 0:
+                heapq.heappop(self._waiters)
+                self.request_bucket.consume(1)
+                self.token_bucket.consume(waiter.tokens)
+                waiter.future.set_result(None)
+                continue
+
+            # Sleep until the head can be served, or until a new (possibly higher priority) waiter arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of bucket levels, queue depth and per-priority queue wait times
+        """
+        self.request_bucket._refill()
+        self.token_bucket._refill()
+        priorities = {}
+        for priority, stats in sorted(self._stats.items()):
+            admitted = stats["admitted"]
+            priorities[str(priority)] = {
+                "admitted": admitted,
+                "shed": stats["shed"],
+                "avg_wait_seconds": stats["total_wait"] / admitted if admitted else 0.0,
+                "max_wait_seconds": stats["max_wait"],
+            }
+        return {
+            "queue_depth": sum(1 for _, _, waiter in self._waiters if not waiter.future.done()),
+            "requests_available": self.request_bucket.tokens,
+            "tokens_available": self.token_bucket.tokens,
+            "priorities": priorities,
+        }
+
+# Shared controller for every LLM call in this process
+llm_admission = AdmissionController()
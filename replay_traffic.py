@@ -0,0 +1,183 @@
+"""
+Replay recorded /process-query traffic against a local instance.
+
+Record traffic by running the app with TRAFFIC_RECORD_PATH=traffic.jsonl, then start
+a local instance with TRAFFIC_REPLAY_PATH pointing at the same file so LLM and
+Node.js API results are served from the recording, and run:
+
+    python replay_traffic.py traffic.jsonl --target http://localhost:8000 --speedup 10 --concurrency 20
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import httpx
+from traffic_recorder import REPLAY_ID_HEADER, load_recording
+
+# Fields that legitimately differ between runs
+VOLATILE_KEYS = {"conversation_id", "batch_id", "job_ids", "timestamp", "createdAt", "updatedAt"}
+
+def strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: strip_volatile(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [strip_volatile(item) for item in value]
+    return value
+
+def diff(expected: Any, actual: Any, path: str = "") -> List[str]:
+    """
+    Human readable differences between the recorded and replayed response bodies
+    """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        differences = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            child = f"{path}.{key}" if path else str(key)
+            if key not in actual:
+                differences.append(f"{child}: missing")
+            elif key not in expected:
+                differences.append(f"{child}: unexpected")
+            else:
+                differences.extend(diff(expected[key], actual[key], child))
+        return differences
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        return [d for i, (e, a) in enumerate(zip(expected, actual)) for d in diff(e, a, f"{path}[{i}]")]
+    if expected != actual:
+        return [f"{path or '<body>'}: expected {json.dumps(expected, default=str)[:200]}, got {json.dumps(actual, default=str)[:200]}"]
+    return []
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def recorded_offsets(entries: List[Dict[str, Any]]) -> List[float]:
+    """
+    Seconds between the first recorded request and each entry
+    """
+    times = [datetime.fromisoformat(entry["recorded_at"]) for entry in entries]
+    start = min(times) if times else None
+    return [(t - start).total_seconds() for t in times]
+
+async def replay_entry(client: httpx.AsyncClient, entry: Dict[str, Any], token: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        response = await client.post(
+            "/process-query",
+            json=entry["request"],
+            headers={"Authorization": f"Bearer {token}", REPLAY_ID_HEADER: entry["id"]},
+        )
+        status_code = response.status_code
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+    except httpx.RequestError as exc:
+        status_code, body = None, f"Request failed: {exc}"
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    recorded = entry.get("response", {})
+    differences = []
+    if status_code != recorded.get("status_code"):
+        differences.append(f"status: expected {recorded.get('status_code')}, got {status_code}")
+    differences.extend(diff(strip_volatile(recorded.get("body")), strip_volatile(body)))
+    return {
+        "id": entry["id"],
+        "status_code": status_code,
+        "latency_ms": latency_ms,
+        "recorded_latency_ms": entry.get("latency_ms"),
+        "diffs": differences,
+    }
+
+async def replay(
+    entries: List[Dict[str, Any]],
+    target: str,
+    token: str,
+    speedup: float,
+    concurrency: int,
+    timeout: float,
+) -> List[Dict[str, Any]]:
+    """
+    Send every recorded request, preserving recorded spacing divided by `speedup`
+    (0 sends as fast as `concurrency` allows)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    offsets = recorded_offsets(entries)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+
+        async def run(entry: Dict[str, Any], offset: float):
+            if speedup > 0:
+                delay = offset / speedup - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            async with semaphore:
+                return await replay_entry(client, entry, token)
+
+        return await asyncio.gather(*(run(entry, offset) for entry, offset in zip(entries, offsets)))
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = [result["latency_ms"] for result in results]
+    recorded = [result["recorded_latency_ms"] for result in results if result["recorded_latency_ms"] is not None]
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[str(result["status_code"])] = statuses.get(str(result["status_code"]), 0) + 1
+    mismatched = [result for result in results if result["diffs"]]
+
+    def distribution(values: List[float]) -> Dict[str, float]:
+        return {
+            "p50": round(percentile(values, 50), 2),
+            "p90": round(percentile(values, 90), 2),
+            "p99": round(percentile(values, 99), 2),
+            "max": round(max(values), 2) if values else 0.0,
+        }
+
+    return {
+        "requests": len(results),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "status_codes": statuses,
+        "latency_ms": distribution(latencies),
+        "recorded_latency_ms": distribution(recorded),
+        "mismatched": len(mismatched),
+        "mismatches": [{"id": result["id"], "diffs": result["diffs"][:10]} for result in mismatched],
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay recorded /process-query traffic against a local instance")
+    parser.add_argument("recording", help="JSONL file written with TRAFFIC_RECORD_PATH")
+    parser.add_argument("--target", default="http://localhost:8000", help="Base URL of the instance under test")
+    parser.add_argument("--token", default="replay", help="Bearer token sent with each request")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Divide recorded request spacing by this factor; 0 disables pacing")
+    parser.add_argument("--concurrency", type=int, default=10, help="Maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N recorded requests")
+    parser.add_argument("--report", default=None, help="Also write the full report, including per-request results, to this JSON file")
+    args = parser.parse_args(argv)
+
+    entries = load_recording(args.recording)[:args.limit]
+    if not entries:
+        sys.exit("No recorded requests to replay")
+
+    started = time.perf_counter()
+    results = asyncio.run(replay(entries, args.target, args.token, args.speedup, args.concurrency, args.timeout))
+    summary = summarize(results, time.perf_counter() - started)
+
+    print(json.dumps({key: value for key, value in summary.items() if key != "mismatches"}, indent=2))
+    for mismatch in summary["mismatches"][:20]:
+        print(f"\n{mismatch['id']}:")
+        for difference in mismatch["diffs"]:
+            print(f"  {difference}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({**summary, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
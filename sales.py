@@ -1,10 +1,21 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, EmailStr
+import os
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.security import OAuth2PasswordBearer
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 import httpx
+from job_queue import JobQueue
+from intent_registry import register_intent, get_intent_spec
+from traffic_recorder import upstream_transport
 
 router = APIRouter(prefix="/sales", tags=["Sales"])
 NODEJS_API_BASE = "http://localhost:5000/api/v1"  # Update with actual Node.js API URL
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+INVOICE_WORKER_CONCURRENCY = int(os.getenv("INVOICE_WORKER_CONCURRENCY", "8"))
+INVOICE_MAX_RETRIES = int(os.getenv("INVOICE_MAX_RETRIES", "3"))
+# Rendering and emailing an invoice can take well over httpx's default 5 s
+INVOICE_TIMEOUT = float(os.getenv("INVOICE_TIMEOUT", "60"))
 
 # Pydantic Schemas
 class ProductItem(BaseModel):
@@ -15,7 +26,7 @@ class ProductItem(BaseModel):
 
 class SaleCreate(BaseModel):
     customerId: str
-    products: List[ProductItem]
+    products: List[ProductItem] = Field(..., min_length=1)
     paymentMethod: str
     amountPaid: Optional[float] = 0
 
@@ -23,59 +34,34 @@ class InvoiceGenerate(BaseModel):
     saleId: str
     recipientEmail: EmailStr
 
-# Function to detect intent
-def detect_intent(intent: str, data: Dict[str, Any]):
-    """
-    Map sales-related intents to appropriate API endpoints and HTTP methods
-    """
-    if intent == "create_sale":
-        return f"{NODEJS_API_BASE}/sales/buy-product", "POST", data
-    
-    elif intent == "generate_invoice":
-        return f"{NODEJS_API_BASE}/sales/invoices", "POST", data
-    
-    else:
-        raise HTTPException(status_code=400, detail=f"Invalid sales intent: {intent}")
+class InvoiceBulkGenerate(BaseModel):
+    invoices: List[InvoiceGenerate]
+
+# Intent registry entries
+register_intent("sales", "create_sale", "POST", f"{NODEJS_API_BASE}/sales/buy-product", SaleCreate)
+register_intent("sales", "generate_invoice", "POST", f"{NODEJS_API_BASE}/sales/invoices", InvoiceGenerate)
 
 # Generic intent handler
 async def handle_intent(intent: str, data: Dict[str, Any]):
     """
-    Process sales-related intents with provided data and forward to Node.js API
+    Process sales-related intents with provided data and forward to Node.js API.
+    `data` is expected to have been validated against the intent registry.
     """
-    # Validate data based on intent
-    if intent == "create_sale":
-        required_fields = ["customerId", "products", "paymentMethod"]
-        if not all(k in data for k in required_fields):
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Missing required fields. Required: {', '.join(required_fields)}"
-            )
-        
-        # Validate products list
-        products = data.get("products", [])
-        if not isinstance(products, list) or len(products) == 0:
-            raise HTTPException(status_code=400, detail="At least one product is required for a sale")
-        
-        # Check each product has required fields
-        for i, product in enumerate(products):
-            if not all(k in product for k in ["productId", "quantity", "rate", "gstApplied"]):
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Product at index {i} is missing required fields"
-                )
-    
-    elif intent == "generate_invoice":
-        if not all(k in data for k in ["saleId", "recipientEmail"]):
-            raise HTTPException(
-                status_code=400, 
-                detail="saleId and recipientEmail are required for generating an invoice"
-            )
+    if intent == "generate_invoice":
+        # Invoice rendering and emailing runs in the background; return the job IDs right away
+        submitted = await invoice_queue.submit([data])
+        return {"status": "queued", **submitted}
     
     # Get URL, method, and payload for the intent
-    url, method, payload = detect_intent(intent, data)
-    
+    url, method, payload = get_intent_spec("sales", intent).build_request(data)
+    return await call_nodejs_api(url, method, payload)
+
+async def call_nodejs_api(url: str, method: str, payload: Optional[Dict[str, Any]], timeout: float = 5.0):
+    """
+    Forward a request to the Node.js API and return its JSON response
+    """
     # Make the API request
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=upstream_transport(), timeout=timeout) as client:
         try:
             if method == "POST":
                 response = await client.post(url, json=payload)
@@ -95,4 +81,40 @@ async def handle_intent(intent: str, data: Dict[str, Any]):
             return response.json()
             
         except httpx.RequestError as exc:
-            raise HTTPException(status_code=500, detail=f"API request failed: {str(exc)}")
\ No newline at end of file
+            # Keep the httpx error as the cause so the invoice queue can tell whether it was sent
+            raise HTTPException(status_code=500, detail=f"API request failed: {str(exc)}") from exc
+
+async def generate_invoice(data: Dict[str, Any]):
+    """
+    Ask the Node.js API to generate and email an invoice (run by the invoice workers)
+    """
+    url, method, payload = get_intent_spec("sales", "generate_invoice").build_request(data)
+    return await call_nodejs_api(url, method, payload, timeout=INVOICE_TIMEOUT)
+
+invoice_queue = JobQueue(generate_invoice, concurrency=INVOICE_WORKER_CONCURRENCY, max_retries=INVOICE_MAX_RETRIES)
+
+@router.post("/invoices/jobs", dependencies=[Depends(oauth2_scheme)])
+async def submit_invoice_jobs(request: InvoiceBulkGenerate):
+    """
+    Queue invoice generation for one or many sales and return the job IDs immediately
+    """
+    if not request.invoices:
+        raise HTTPException(status_code=400, detail="At least one invoice is required")
+    submitted = await invoice_queue.submit([invoice.dict() for invoice in request.invoices])
+    return {"status": "queued", **submitted}
+
+@router.get("/invoices/jobs/{job_id}", dependencies=[Depends(oauth2_scheme)])
+async def get_invoice_job(job_id: str):
+    return invoice_queue.get_job(job_id)
+
+@router.get("/invoices/batches/{batch_id}", dependencies=[Depends(oauth2_scheme)])
+async def get_invoice_batch(batch_id: str):
+    return invoice_queue.get_batch(batch_id)
+
+@router.get("/invoices/batches/{batch_id}/events", dependencies=[Depends(oauth2_scheme)])
+async def stream_invoice_batch(batch_id: str):
+    """
+    Stream batch progress as server-sent events until every job has finished
+    """
+    invoice_queue.get_batch(batch_id)
+    return StreamingResponse(invoice_queue.stream_batch(batch_id), media_type="text/event-stream")
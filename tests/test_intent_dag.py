@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from intent_dag import normalize_intents, resolve_references, execute_intent_graph
+
+def graph(*nodes):
+    return {"intents": [dict(node, data=node.get("data", {})) for node in nodes]}
+
+def test_single_intent_is_wrapped():
+    intents = normalize_intents({"category": "product", "intent": "get_all_products", "data": {}})
+    assert intents == [{"id": "t1", "category": "product", "intent": "get_all_products", "data": {}, "depends_on": []}]
+
+def test_placeholders_add_implicit_dependencies():
+    intents = normalize_intents(graph(
+        {"id": "t1", "category": "customer", "intent": "create_customer"},
+        {"id": "t2", "category": "sales", "intent": "create_sale", "data": {"customerId": "{{t1.customerId}}"}},
+    ))
+    assert intents[1]["depends_on"] == ["t1"]
+
+@pytest.mark.parametrize("intent_data", [
+    graph({"id": "a", "category": "x", "intent": "y", "depends_on": ["missing"]}),
+    graph({"id": "a", "category": "x", "intent": "y"}, {"id": "a", "category": "x", "intent": "y"}),
+    graph(
+        {"id": "a", "category": "x", "intent": "y", "data": {"v": "{{b.id}}"}},
+        {"id": "b", "category": "x", "intent": "y", "data": {"v": "{{a.id}}"}},
+    ),
+    {"intents": []},
+])
+def test_invalid_graphs_are_rejected(intent_data):
+    with pytest.raises(HTTPException):
+        normalize_intents(intent_data)
+
+def test_resolve_references_looks_inside_data_and_falls_back_to_mongo_id():
+    results = {"t1": {"status": "success", "data": {"_id": "c1", "address": {"city": "Pune"}}}}
+    resolved = resolve_references(
+        {"customerId": "{{t1.customerId}}", "city": "{{t1.address.city}}", "items": ["{{t1.data._id}}", "plain"]},
+        results,
+    )
+    assert resolved == {"customerId": "c1", "city": "Pune", "items": ["c1", "plain"]}
+    with pytest.raises(HTTPException):
+        resolve_references("{{t1.nothing}}", results)
+
+def test_independent_intents_run_concurrently_and_dependents_chain():
+    intents = normalize_intents(graph(
+        {"id": "t1", "category": "customer", "intent": "create_customer"},
+        {"id": "t2", "category": "product", "intent": "create_product"},
+        {"id": "t3", "category": "sales", "intent": "create_sale",
+         "data": {"customerId": "{{t1.customerId}}", "products": [{"productId": "{{t2.productId}}"}]}},
+    ))
+    calls = []
+
+    async def run():
+        started = {"create_customer": asyncio.Event(), "create_product": asyncio.Event()}
+
+        async def dispatch(category, intent, data):
+            calls.append((intent, data))
+            if intent in started:
+                # t1 and t2 can only finish if both are in flight at the same time
+                started[intent].set()
+                await asyncio.gather(*(event.wait() for event in started.values()))
+            return {"data": {"_id": f"{intent}-id"}}
+
+        return await asyncio.wait_for(execute_intent_graph(intents, dispatch), timeout=2)
+
+    outcomes = asyncio.run(run())
+    assert [outcome["status"] for outcome in outcomes] == ["success"] * 3
+    # t3 waits for both
+    assert calls[-1] == ("create_sale", {"customerId": "create_customer-id", "products": [{"productId": "create_product-id"}]})
+
+def test_failed_dependency_skips_dependents_only():
+    intents = normalize_intents(graph(
+        {"id": "t1", "category": "customer", "intent": "create_customer"},
+        {"id": "t2", "category": "sales", "intent": "create_sale", "data": {"customerId": "{{t1.customerId}}"}},
+        {"id": "t3", "category": "product", "intent": "create_product"},
+    ))
+
+    async def dispatch(category, intent, data):
+        if intent == "create_customer":
+            raise HTTPException(status_code=400, detail="bad customer")
+        return {"status": "success"}
+
+    outcomes = asyncio.run(execute_intent_graph(intents, dispatch))
+    assert [outcome["status"] for outcome in outcomes] == ["error", "skipped", "success"]
+    assert outcomes[0]["message"] == "bad customer"
@@ -0,0 +1,113 @@
+import asyncio
+import httpx
+from fastapi import HTTPException
+from job_queue import JobQueue, is_retryable, JOB_SUCCEEDED, JOB_FAILED
+
+def wrapped(exc: Exception) -> HTTPException:
+    # The way sales.call_nodejs_api surfaces httpx errors
+    try:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    except HTTPException as e:
+        return e
+
+async def wait_for_batch(queue: JobQueue, batch_id: str):
+    async for _ in queue.stream_batch(batch_id, heartbeat=0.05):
+        pass
+    return queue.get_batch(batch_id)
+
+def test_only_unsent_requests_and_rate_limits_are_retryable():
+    assert is_retryable(httpx.ConnectError("refused"))
+    assert is_retryable(wrapped(httpx.ConnectTimeout("slow connect")))
+    assert is_retryable(HTTPException(status_code=429))
+    # The upstream may already have generated and emailed the invoice
+    assert not is_retryable(wrapped(httpx.ReadTimeout("slow render")))
+    assert not is_retryable(HTTPException(status_code=502))
+    assert not is_retryable(HTTPException(status_code=400))
+
+def test_retries_connect_errors_then_succeeds():
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+        if len(calls) < 3:
+            raise wrapped(httpx.ConnectError("refused"))
+        return {"ok": True}
+
+    async def run():
+        queue = JobQueue(handler, concurrency=1, max_retries=3, retry_backoff=0.01)
+        submitted = await queue.submit([{"saleId": "s1"}])
+        batch = await wait_for_batch(queue, submitted["batch_id"])
+        job = batch["jobs"][0]
+        assert job["status"] == JOB_SUCCEEDED
+        assert job["attempts"] == 3
+    asyncio.run(run())
+
+def test_read_timeout_is_not_retried():
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+        raise wrapped(httpx.ReadTimeout("slow render"))
+
+    async def run():
+        queue = JobQueue(handler, concurrency=1, max_retries=3, retry_backoff=0.01)
+        submitted = await queue.submit([{"saleId": "s1"}])
+        batch = await wait_for_batch(queue, submitted["batch_id"])
+        assert batch["jobs"][0]["status"] == JOB_FAILED
+        assert len(calls) == 1
+    asyncio.run(run())
+
+def test_backoff_does_not_hold_a_worker_slot():
+    finished = []
+
+    async def handler(payload):
+        if payload["name"] == "flaky" and "flaky-failed" not in finished:
+            finished.append("flaky-failed")
+            raise HTTPException(status_code=429)
+        finished.append(payload["name"])
+        return {}
+
+    async def run():
+        queue = JobQueue(handler, concurrency=1, max_retries=1, retry_backoff=0.2)
+        submitted = await queue.submit([{"name": "flaky"}, {"name": "steady"}])
+        await wait_for_batch(queue, submitted["batch_id"])
+        # The single worker ran "steady" while "flaky" was backing off
+        assert finished == ["flaky-failed", "steady", "flaky"]
+    asyncio.run(run())
+
+def test_pruning_keeps_batches_whole_and_streams_finish():
+    async def run():
+        release = asyncio.Event()
+
+        async def handler(payload):
+            if payload.get("slow"):
+                await release.wait()
+            return {}
+
+        queue = JobQueue(handler, concurrency=4, max_finished_jobs=1)
+        first = await queue.submit([{}])
+        await wait_for_batch(queue, first["batch_id"])
+        second = await queue.submit([{}, {}, {"slow": True}, {"slow": True}])
+        while queue.get_batch(second["batch_id"])["completed"] < 2:
+            await asyncio.sleep(0)
+        # Pruning runs while the second batch is half done: only the finished first batch may go
+        third = await queue.submit([{}])
+        assert first["batch_id"] not in queue.batches
+        assert len(queue.get_batch(second["batch_id"])["jobs"]) == 4
+        release.set()
+        batch = await asyncio.wait_for(wait_for_batch(queue, second["batch_id"]), timeout=2)
+        assert batch["total"] == batch["completed"] == 4
+        await wait_for_batch(queue, third["batch_id"])
+    asyncio.run(run())
+
+def test_status_views_leave_out_payloads():
+    async def handler(payload):
+        return {}
+
+    async def run():
+        queue = JobQueue(handler, concurrency=1)
+        submitted = await queue.submit([{"recipientEmail": "ravi@shop.in"}])
+        batch = await wait_for_batch(queue, submitted["batch_id"])
+        assert "payload" not in batch["jobs"][0]
+        assert "payload" not in queue.get_job(submitted["job_ids"][0])
+    asyncio.run(run())
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import pytest
+
+pytest.importorskip("langchain_groq")
+pytest.importorskip("motor")
+
+# Never point the tests at a real cluster
+os.environ["MONGO_URI"] = "mongodb://localhost:27017"
+
+import main
+
+@pytest.fixture
+def app_state(monkeypatch):
+    """
+    In-memory conversation store, a scripted LLM and recording intent handlers
+    """
+    state = {"history": [], "llm_calls": 0, "llm_results": [], "dispatched": []}
+
+    async def get_conversation_history(conversation_id, max_messages=5):
+        return [{"role": m["role"], "content": m["content"]} for m in state["history"]][-max_messages:]
+
+    async def save_conversation_message(conversation_id, role, content, user_id=None):
+        state["history"].append({"role": role, "content": content})
+
+    def get_intent_from_ai_agent(query, conversation_history=None):
+        state["llm_calls"] += 1
+        return state["llm_results"].pop(0)
+
+    def handler(category):
+        async def handle(intent, data, token):
+            state["dispatched"].append((category, intent, data))
+            return {"status": "success", "data": {"_id": f"{intent}-id"}}
+        return handle
+
+    monkeypatch.setattr(main, "get_conversation_history", get_conversation_history)
+    monkeypatch.setattr(main, "save_conversation_message", save_conversation_message)
+    monkeypatch.setattr(main, "get_intent_from_ai_agent", get_intent_from_ai_agent)
+    monkeypatch.setattr(main, "INTENT_HANDLERS", {category: handler(category) for category in main.INTENT_HANDLERS})
+    return state
+
+def query(user_query, conversation_id=None, additional_data=None):
+    request = main.IntentRequest(user_query=user_query, conversation_id=conversation_id, additional_data=additional_data)
+    return asyncio.run(main.process_natural_language_query(request, token="token", x_replay_id=None))
+
+def test_missing_fields_follow_up_reuses_stored_intent(app_state):
+    app_state["llm_results"].append({"category": "product", "intent": "create_product", "data": {"name": "Soap"}})
+    first = query("create product Soap")
+    assert first["status"] == "missing_fields"
+    assert first["required_fields"] == ["gstRate", "rate"]
+
+    second = query("18% GST, rate 40", conversation_id=first["conversation_id"], additional_data={"gstRate": 18, "rate": 40})
+    assert second["status"] == "success"
+    # The follow-up completed the stored intent without asking the LLM again
+    assert app_state["llm_calls"] == 1
+    assert app_state["dispatched"] == [("product", "create_product", {"name": "Soap", "gstRate": 18.0, "rate": 40.0})]
+
+def test_multi_intent_follow_up_merges_by_intent_id(app_state):
+    app_state["llm_results"].append({"intents": [
+        {"id": "t1", "category": "customer", "intent": "create_customer", "data": {"name": "Ravi", "email": "ravi@example.com"}},
+        {"id": "t2", "category": "product", "intent": "create_product", "data": {"name": "Soap", "gstRate": 18}},
+    ]})
+    first = query("add customer Ravi and create product Soap at 18% GST")
+    assert first["status"] == "missing_fields"
+    assert first["required_fields_by_intent"] == {"t1": ["phone"], "t2": ["rate"]}
+
+    second = query(
+        "phone 9876543210, rate 40",
+        conversation_id=first["conversation_id"],
+        additional_data={"t1": {"phone": "9876543210"}, "rate": 40},
+    )
+    assert app_state["llm_calls"] == 1
+    assert second["status"] == "success"
+    assert sorted(intent for _, intent, _ in app_state["dispatched"]) == ["create_customer", "create_product"]
+
+def test_follow_up_after_completed_intent_asks_the_llm(app_state):
+    app_state["llm_results"].append({"category": "product", "intent": "get_all_products", "data": {}})
+    app_state["llm_results"].append({"category": "product", "intent": "get_all_products", "data": {}})
+    first = query("list products")
+    query("list products again", conversation_id=first["conversation_id"], additional_data={"rate": 1})
+    assert app_state["llm_calls"] == 2
+
+def test_unsupported_intent_fails_only_its_node(app_state):
+    app_state["llm_results"].append({"intents": [
+        {"id": "t1", "category": "product", "intent": "create_product", "data": {"name": "Soap", "gstRate": 18, "rate": 40}},
+        {"id": "t2", "category": "business", "intent": "get_business_details", "data": {"name": "Vypar"}},
+    ]})
+    result = query("create product Soap and show my business")
+    assert result["status"] == "partial"
+    assert [outcome["status"] for outcome in result["results"]] == ["success", "error"]
+    assert result["results"][1]["message"] == "Invalid business intent: get_business_details"
+
+def test_invalid_single_intent_is_rejected_and_saved(app_state):
+    app_state["llm_results"].append({"category": "product", "intent": "create_product", "data": {"name": "Soap", "gstRate": "high", "rate": 40}})
+    with pytest.raises(main.HTTPException) as exc_info:
+        query("create product Soap")
+    assert exc_info.value.status_code == 400
+    assert app_state["dispatched"] == []
+    assert app_state["history"][-1]["content"].startswith("Error: Invalid data for create_product")
+
+def test_shed_query_is_not_saved_to_history(app_state, monkeypatch):
+    async def shed(priority, tokens):
+        raise main.HTTPException(status_code=429, detail="LLM capacity exceeded, please retry later", headers={"Retry-After": "5"})
+
+    monkeypatch.setattr(main.llm_admission, "acquire", shed)
+    with pytest.raises(main.HTTPException) as exc_info:
+        query("list products", conversation_id="c1")
+    assert exc_info.value.status_code == 429
+    assert app_state["history"] == []
+    assert app_state["llm_calls"] == 0
+
+def test_lifespan_runs_the_loop_lag_monitor(monkeypatch):
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(main, "LOOP_LAG_THRESHOLD_MS", "200")
+    with TestClient(main.app):
+        assert main.loop_lag_monitor.running
+    assert not main.loop_lag_monitor.running
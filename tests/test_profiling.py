@@ -0,0 +1,26 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+import profiling
+
+@pytest.fixture
+def profile_id(monkeypatch):
+    profiler = profiling.RequestProfiler()
+    monkeypatch.setattr(profiling, "request_profiler", profiler)
+    profiler.start(sample_rate=1.0, max_profiles=1)
+
+    async def request():
+        with profiler.profile_request("/process-query"):
+            sum(range(1000))
+
+    asyncio.run(request())
+    return profiler.profiles[0]["id"]
+
+def test_text_profile_is_sorted_by_a_pstats_key(profile_id):
+    response = asyncio.run(profiling.download_profile(profile_id, format="text", sort="time"))
+    assert "function calls" in response.body.decode()
+
+def test_unknown_sort_key_is_a_bad_request(profile_id):
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(profiling.download_profile(profile_id, format="text", sort="nope"))
+    assert exc_info.value.status_code == 400
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from rate_limiter import AdmissionController, TokenBucket, estimate_tokens, PRIORITY_INTERACTIVE, PRIORITY_BATCH, LLM_COMPLETION_TOKEN_RESERVE
+
+def test_estimate_tokens_counts_every_text():
+    assert estimate_tokens("a" * 400, None, "b" * 400) == 200 + LLM_COMPLETION_TOKEN_RESERVE
+
+def test_token_bucket_time_until():
+    bucket = TokenBucket(capacity=10, refill_per_second=10)
+    assert bucket.time_until(10) == 0
+    bucket.consume(10)
+    assert 0.4 < bucket.time_until(5) <= 0.5
+    # Requests larger than the bucket wait for a full bucket rather than forever
+    assert bucket.time_until(1000) <= 1.0
+
+def test_fast_path_admits_without_queueing():
+    async def run():
+        controller = AdmissionController(requests_per_minute=60, tokens_per_minute=6000)
+        assert await controller.acquire(PRIORITY_INTERACTIVE, 100) == 0.0
+        assert controller.stats()["priorities"]["0"]["admitted"] == 1
+    asyncio.run(run())
+
+def test_interactive_work_is_served_before_batch():
+    async def run():
+        # One request every 0.05 s
+        controller = AdmissionController(requests_per_minute=1200, tokens_per_minute=10 ** 6, max_queue_wait=5)
+        controller.request_bucket.tokens = 0
+        order = []
+
+        async def call(priority, name):
+            await controller.acquire(priority, 10)
+            order.append(name)
+
+        batch = asyncio.ensure_future(call(PRIORITY_BATCH, "batch"))
+        await asyncio.sleep(0)
+        interactive = [asyncio.ensure_future(call(PRIORITY_INTERACTIVE, f"interactive-{i}")) for i in range(2)]
+        await asyncio.gather(batch, *interactive)
+        assert order == ["interactive-0", "interactive-1", "batch"]
+        assert controller.stats()["priorities"]["10"]["max_wait_seconds"] > 0
+    asyncio.run(run())
+
+def test_sheds_with_retry_after_when_wait_exceeds_deadline():
+    async def run():
+        controller = AdmissionController(requests_per_minute=6, tokens_per_minute=10 ** 6, max_queue_wait=1)
+        controller.request_bucket.tokens = 0
+        with pytest.raises(HTTPException) as exc_info:
+            await controller.acquire(PRIORITY_INTERACTIVE, 10)
+        assert exc_info.value.status_code == 429
+        assert int(exc_info.value.headers["Retry-After"]) >= 1
+        assert controller.stats()["priorities"]["0"]["shed"] == 1
+    asyncio.run(run())
+
+def test_sheds_when_queue_is_full():
+    async def run():
+        controller = AdmissionController(requests_per_minute=600, tokens_per_minute=10 ** 6, max_queue_wait=5, max_queue_size=1)
+        controller.request_bucket.tokens = 0
+        first = asyncio.ensure_future(controller.acquire(PRIORITY_INTERACTIVE, 10))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc_info:
+            await controller.acquire(PRIORITY_INTERACTIVE, 10)
+        assert exc_info.value.status_code == 429
+        await first
+    asyncio.run(run())
+
+def test_oversized_request_waits_for_a_full_bucket_instead_of_being_shed():
+    async def run():
+        controller = AdmissionController(requests_per_minute=60, tokens_per_minute=6000, max_queue_wait=10)
+        controller.token_bucket.tokens = 5500
+        # 500 tokens short of a full bucket at 100 tokens/s
+        assert 4.9 < controller._time_until_ready(1, 7000) <= 5.0
+        assert controller._estimated_wait(PRIORITY_INTERACTIVE, 7000) <= 5.0
+        controller.max_queue_wait = 0.05
+        controller.token_bucket.tokens = 5999
+        assert await controller.acquire(PRIORITY_INTERACTIVE, 7000) < 0.05
+    asyncio.run(run())
@@ -0,0 +1,37 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import sales
+from job_queue import JobQueue
+
+@pytest.fixture
+def client(monkeypatch):
+    generated = []
+
+    async def generate_invoice(data):
+        generated.append(data)
+        return {"status": "success"}
+
+    monkeypatch.setattr(sales, "invoice_queue", JobQueue(generate_invoice, concurrency=1))
+    app = FastAPI()
+    app.include_router(sales.router)
+    with TestClient(app) as client:
+        client.generated = generated
+        yield client
+
+INVOICES = {"invoices": [{"saleId": "s1", "recipientEmail": "ravi@shop.in"}]}
+
+def test_invoice_job_routes_require_a_bearer_token(client):
+    assert client.post("/sales/invoices/jobs", json=INVOICES).status_code == 401
+    assert client.get("/sales/invoices/jobs/j1").status_code == 401
+    assert client.get("/sales/invoices/batches/b1").status_code == 401
+    assert client.get("/sales/invoices/batches/b1/events").status_code == 401
+    assert client.generated == []
+
+def test_invoice_job_status_hides_the_recipient(client):
+    headers = {"Authorization": "Bearer token"}
+    submitted = client.post("/sales/invoices/jobs", json=INVOICES, headers=headers).json()
+    assert submitted["status"] == "queued"
+    job = client.get(f"/sales/invoices/jobs/{submitted['job_ids'][0]}", headers=headers).json()
+    batch = client.get(f"/sales/invoices/batches/{submitted['batch_id']}", headers=headers).json()
+    assert "ravi@shop.in" not in str(job) + str(batch)
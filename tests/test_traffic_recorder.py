@@ -0,0 +1,114 @@
+import json
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+import traffic_recorder
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    path = tmp_path / "traffic.jsonl"
+    monkeypatch.setattr(traffic_recorder, "TRAFFIC_RECORD_PATH", str(path))
+    monkeypatch.setattr(traffic_recorder, "TRAFFIC_REPLAY_PATH", None)
+    yield path
+    traffic_recorder._close_writer()
+    traffic_recorder._writer = None
+
+def replay_from(path, monkeypatch):
+    entries = traffic_recorder.load_recording(str(path))
+    monkeypatch.setattr(traffic_recorder, "TRAFFIC_REPLAY_PATH", str(path))
+    monkeypatch.setattr(traffic_recorder, "_replay_entries", {entry["id"]: entry for entry in entries})
+    return entries
+
+def test_sanitize_masks_contact_details_consistently():
+    sanitized = traffic_recorder.sanitize({"email": "ravi@shop.in", "note": "mail ravi@shop.in", "password": "x", "id": "65f1a2b3c4d5e6f708091a2b"})
+    assert sanitized["email"].endswith("@example.com")
+    assert sanitized["note"] == f"mail {sanitized['email']}"
+    assert sanitized["password"] == "[REDACTED]"
+    assert sanitized["id"] == "65f1a2b3c4d5e6f708091a2b"
+
+def test_lookups_are_recorded_then_replayed_without_the_database(recording, monkeypatch):
+    database = {"ravi@shop.in": "c1"}
+    queries = []
+
+    @traffic_recorder.recorded("customer_id_by_email")
+    async def get_customer_id(email):
+        queries.append(email)
+        if email not in database:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        return database[email]
+
+    async def record():
+        traffic_recorder.begin({"user_query": "bill for ravi@shop.in"})
+        assert await get_customer_id("ravi@shop.in") == "c1"
+        with pytest.raises(HTTPException):
+            await get_customer_id("nobody@shop.in")
+        traffic_recorder.finish(200, {"ok": True})
+
+    asyncio.run(record())
+    traffic_recorder.flush()
+    [entry] = replay_from(recording, monkeypatch)
+    assert len(entry["lookups"]) == 2
+    assert "ravi@shop.in" not in json.dumps(entry)
+
+    database.clear()
+    queries.clear()
+
+    async def replay():
+        traffic_recorder.begin({}, entry["id"])
+        sanitized_email = entry["request"]["user_query"].split()[-1]
+        assert await get_customer_id(sanitized_email) == "c1"
+        with pytest.raises(HTTPException) as exc_info:
+            await get_customer_id("anything")
+        assert exc_info.value.status_code == 404
+        assert traffic_recorder.is_replaying()
+
+    asyncio.run(replay())
+    assert queries == []
+
+def test_replayed_lookup_without_recording_uses_missing(recording, monkeypatch):
+    recording.write_text(json.dumps({"id": "r1", "recorded_at": "2026-01-01T00:00:00", "request": {}}) + "\n")
+    replay_from(recording, monkeypatch)
+
+    @traffic_recorder.recorded("conversation_history", missing=list)
+    async def get_history(conversation_id):
+        raise AssertionError("database must not be queried during replay")
+
+    async def replay():
+        traffic_recorder.begin({}, "r1")
+        return await get_history("c1")
+
+    assert asyncio.run(replay()) == []
+
+def test_entries_are_written_off_the_event_loop(recording):
+    async def record():
+        traffic_recorder.begin({"user_query": "hi"})
+        traffic_recorder.finish(200, {"ok": True})
+
+    asyncio.run(record())
+    traffic_recorder.flush()
+    assert traffic_recorder._writer is not threading.current_thread()
+    assert len(traffic_recorder.load_recording(str(recording))) == 1
+
+def test_sanitize_leaves_dates_amounts_and_quantities_alone():
+    data = {"q": "sell 10 20 30 40 units", "d": "2026-10-18", "amt": "1500000000", "qty": 1234567890}
+    assert traffic_recorder.sanitize(data) == data
+
+def test_sanitize_pseudonymizes_phone_numbers():
+    sanitized = traffic_recorder.sanitize({"q": "call +91 9876543210 or 09876543211", "phone": "12345", "mobile": 9876543210})
+    assert "9876543210" not in sanitized["q"] and "9876543211" not in sanitized["q"]
+    assert sanitized["q"].startswith("call 9")
+    assert sanitized["phone"] != "12345"
+    assert sanitized["mobile"] != 9876543210
+
+def test_replay_rejects_requests_without_a_recording(recording, monkeypatch):
+    recording.write_text(json.dumps({"id": "r1", "recorded_at": "2026-01-01T00:00:00", "request": {}}) + "\n")
+    replay_from(recording, monkeypatch)
+
+    async def begin(replay_id):
+        return traffic_recorder.begin({}, replay_id)
+
+    for replay_id in (None, "unknown"):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(begin(replay_id))
+        assert exc_info.value.status_code == 404
@@ -0,0 +1,286 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import atexit
+import hashlib
+import functools
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+import httpx
+from fastapi import HTTPException
+
+# Opt-in: set TRAFFIC_RECORD_PATH to append sanitized /process-query traffic to a JSONL file
+TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH")
+# Set TRAFFIC_REPLAY_PATH to serve LLM and upstream results from a recording (see replay_traffic.py)
+TRAFFIC_REPLAY_PATH = os.getenv("TRAFFIC_REPLAY_PATH")
+REPLAY_ID_HEADER = "X-Replay-Id"
+
+SENSITIVE_KEYS = {"password", "token", "access_token", "refresh_token", "authorization", "gstnumber"}
+# Values under these keys are always pseudonymized, whatever their shape
+PHONE_KEYS = {"phone", "mobile", "phonenumber", "mobilenumber"}
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+# Indian mobile numbers in free text: optional +91/0 prefix, then ten digits starting 6-9.
+# Deliberately narrow so dates, amounts and quantity lists pass through unchanged.
+PHONE_PATTERN = re.compile(r"(?<![\w+])(?:\+91[ -]?|0)?[6-9]\d{9}(?!\w)")
+
+# Capture for the request being handled; shared with tasks spawned while handling it
+current_capture: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_capture", default=None)
+
+def _pseudonym(value: str) -> str:
+    # Same input always maps to the same pseudonym so recordings stay self-consistent
+    return hashlib.sha1(value.encode()).hexdigest()[:10]
+
+def _pseudonym_phone(value: str) -> str:
+    return f"9{int(_pseudonym(value), 16) % 10 ** 9:09d}"
+
+def sanitize(value: Any) -> Any:
+    """
+    Mask emails, phone numbers and credentials in recorded data
+    """
+    if isinstance(value, dict):
+        sanitized = {}
+        for key, item in value.items():
+            if key.lower() in SENSITIVE_KEYS:
+                sanitized[key] = "[REDACTED]"
+            elif key.lower() in PHONE_KEYS and isinstance(item, (str, int)) and not isinstance(item, bool):
+                sanitized[key] = _pseudonym_phone(str(item))
+            else:
+                sanitized[key] = sanitize(item)
+        return sanitized
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    if isinstance(value, str):
+        value = EMAIL_PATTERN.sub(lambda m: f"user-{_pseudonym(m.group(0))}@example.com", value)
+        return PHONE_PATTERN.sub(lambda m: _pseudonym_phone(m.group(0)), value)
+    return value
+
+def _decode_body(content: bytes) -> Any:
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode(errors="replace")
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries
+
+_replay_entries: Dict[str, Dict[str, Any]] = {}
+if TRAFFIC_REPLAY_PATH:
+    _replay_entries = {entry["id"]: entry for entry in load_recording(TRAFFIC_REPLAY_PATH)}
+
+def begin(request_body: Dict[str, Any], replay_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Start capturing the current request; returns None when neither recording nor replaying.
+    While replaying, a request without a matching recording is rejected rather than
+    run against Groq and the live database.
+    """
+    if TRAFFIC_REPLAY_PATH:
+        entry = _replay_entries.get(replay_id) if replay_id else None
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Unknown replay id")
+        capture = {
+            "mode": "replay",
+            "llm": list(entry.get("llm", [])),
+            "upstream": list(entry.get("upstream", [])),
+            "lookups": list(entry.get("lookups", [])),
+        }
+    elif TRAFFIC_RECORD_PATH:
+        capture = {
+            "mode": "record",
+            "id": uuid.uuid4().hex,
+            "recorded_at": datetime.utcnow().isoformat(),
+            "started": time.perf_counter(),
+            "request": sanitize(request_body),
+            "llm": [],
+            "upstream": [],
+            "lookups": [],
+        }
+    else:
+        return None
+    current_capture.set(capture)
+    return capture
+
+def replayed_llm_result() -> Optional[Dict[str, Any]]:
+    """
+    Next recorded LLM result when replaying, otherwise None
+    """
+    capture = current_capture.get()
+    if capture is None or capture["mode"] != "replay" or not capture["llm"]:
+        return None
+    return capture["llm"].pop(0)
+
+def record_llm_result(result: Any):
+    capture = current_capture.get()
+    if capture is not None and capture["mode"] == "record":
+        capture["llm"].append(sanitize(result))
+
+def is_replaying() -> bool:
+    capture = current_capture.get()
+    return capture is not None and capture["mode"] == "replay"
+
+def recorded(kind: str, missing: Callable[[], Any] = lambda: None):
+    """
+    Decorator for async database lookups (conversation history, customer ids):
+    results are captured while recording and served from the recording while
+    replaying, so a replay never touches the live database. A replayed lookup
+    with no recorded result returns (or raises) whatever `missing()` does.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            capture = current_capture.get()
+            if capture is None:
+                return await func(*args, **kwargs)
+            key = json.dumps([args, kwargs], default=str)
+            if capture["mode"] == "replay":
+                # Replayed arguments come from the recording, so they are already sanitized
+                lookups = capture["lookups"]
+                matches = [i for i, lookup in enumerate(lookups) if lookup["kind"] == kind and lookup["key"] == key]
+                matches = matches or [i for i, lookup in enumerate(lookups) if lookup["kind"] == kind]
+                if not matches:
+                    return missing()
+                lookup = lookups.pop(matches[0])
+                if "error" in lookup:
+                    raise HTTPException(status_code=lookup["error"]["status_code"], detail=lookup["error"]["detail"])
+                return lookup["result"]
+            key = sanitize(key)
+            try:
+                result = await func(*args, **kwargs)
+            except HTTPException as e:
+                capture["lookups"].append({"kind": kind, "key": key, "error": {"status_code": e.status_code, "detail": e.detail}})
+                raise
+            capture["lookups"].append({"kind": kind, "key": key, "result": sanitize(result)})
+            return result
+        return wrapper
+    return decorator
+
+# Entries are written by a background thread so recording never blocks the event loop
+_pending: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+def _write_entries():
+    with open(TRAFFIC_RECORD_PATH, "a") as f:
+        while True:
+            entry = _pending.get()
+            try:
+                if entry is None:
+                    return
+                f.write(json.dumps(entry, default=str) + "\n")
+                if _pending.empty():
+                    f.flush()
+            finally:
+                _pending.task_done()
+
+def _ensure_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_entries, name="traffic-recorder", daemon=True)
+            _writer.start()
+
+def flush():
+    """
+    Block until every finished request has been written
+    """
+    if _writer is not None and _writer.is_alive():
+        _pending.join()
+
+@atexit.register
+def _close_writer():
+    if _writer is not None and _writer.is_alive():
+        _pending.put(None)
+        _writer.join(timeout=5)
+
+def finish(status_code: int, body: Any):
+    """
+    Queue the completed request for appending to the recording file
+    """
+    capture = current_capture.get()
+    if capture is None or capture["mode"] != "record":
+        return
+    entry = {
+        "id": capture["id"],
+        "recorded_at": capture["recorded_at"],
+        "latency_ms": round((time.perf_counter() - capture["started"]) * 1000, 2),
+        "request": capture["request"],
+        "llm": capture["llm"],
+        "upstream": capture["upstream"],
+        "lookups": capture["lookups"],
+        "response": {"status_code": status_code, "body": sanitize(body)},
+    }
+    _ensure_writer()
+    _pending.put(entry)
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    Passes requests through and records sanitized upstream exchanges
+    """
+    def __init__(self):
+        self._transport = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        content = await response.aread()
+        capture = current_capture.get()
+        if capture is not None and capture["mode"] == "record":
+            capture["upstream"].append({
+                "method": request.method,
+                "url": sanitize(str(request.url)),
+                "request_body": sanitize(_decode_body(request.content)),
+                "status_code": response.status_code,
+                "content_type": response.headers.get("content-type"),
+                "body": sanitize(_decode_body(content)),
+            })
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Serves recorded upstream responses instead of calling the Node.js API
+    """
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        capture = current_capture.get()
+        recorded = capture["upstream"] if capture is not None and capture["mode"] == "replay" else []
+        path = request.url.path
+        for i, exchange in enumerate(recorded):
+            if exchange["method"] == request.method and urlsplit(exchange["url"]).path == path:
+                recorded.pop(i)
+                body = exchange["body"]
+                if isinstance(body, str) or body is None:
+                    content = (body or "").encode()
+                else:
+                    content = json.dumps(body).encode()
+                headers = {"content-type": exchange["content_type"]} if exchange.get("content_type") else {}
+                return httpx.Response(exchange["status_code"], headers=headers, content=content, request=request)
+        # Never fall through to the real upstream while replaying
+        return httpx.Response(
+            502,
+            headers={"content-type": "application/json"},
+            content=json.dumps({"message": f"No recorded upstream response for {request.method} {path}"}).encode(),
+            request=request,
+        )
+
+def upstream_transport() -> Optional[httpx.AsyncBaseTransport]:
+    """
+    Transport for Node.js API clients: recording, replaying, or None for httpx's default
+    """
+    if TRAFFIC_REPLAY_PATH:
+        return ReplayTransport()
+    if TRAFFIC_RECORD_PATH:
+        return RecordingTransport()
+    return None